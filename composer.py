@@ -2,6 +2,8 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Optional
 import re
+import functools
+import time
 
 # ========== LLM Integration (Ollama Only) ==========
 # This system uses OLLAMA for local LLM inference
@@ -17,7 +19,7 @@ import re
 # to Ollama's OpenAI-compatible API endpoint (http://localhost:11434/v1)
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, APIConnectionError, APITimeoutError
     LLM_AVAILABLE = True
 except ImportError:
     LLM_AVAILABLE = False
@@ -34,6 +36,18 @@ OLLAMA_MODEL = "llama3.2:3b"  # Available models: llama3.2:3b, llama3.2:1b, mist
 # ollama pull phi3         (Microsoft, good balance)
 
 
+# After a connection error or timeout, skip the LLM for this long so an
+# unreachable Ollama doesn't add a connect timeout to every SQL/CV answer.
+LLM_RETRY_COOLDOWN_S = 60.0
+_llm_retry_after = 0.0
+
+
+@functools.cache
+def _get_client() -> "OpenAI":
+    """One Ollama client per process so its HTTP connection pool is reused."""
+    return OpenAI(base_url=OLLAMA_BASE_URL, api_key="ollama")
+
+
 def _summarize_rag_context(
     rag_snippets: List[Dict[str, Any]], 
     query: str,
@@ -53,7 +67,8 @@ def _summarize_rag_context(
     Returns:
         Formatted context explanation
     """
-    if not LLM_AVAILABLE or not rag_snippets:
+    global _llm_retry_after
+    if not LLM_AVAILABLE or not rag_snippets or time.monotonic() < _llm_retry_after:
         # Fallback: simple formatting without LLM
         return _format_rag_snippets_simple(rag_snippets)
     
@@ -97,7 +112,7 @@ Task: Summarize the key information from the reference documents that answers th
 Use markdown formatting with bullet points."""
 
         # Call Ollama LLM
-        client = OpenAI(base_url=OLLAMA_BASE_URL, api_key="ollama")
+        client = _get_client()
         
         response = client.chat.completions.create(
             model=OLLAMA_MODEL,
@@ -113,12 +128,18 @@ Use markdown formatting with bullet points."""
         summary = response.choices[0].message.content.strip()
         return summary
         
-    except Exception as e:
+    except (APIConnectionError, APITimeoutError) as e:
+        # Ollama unreachable or too slow: back off for every request
+        _llm_retry_after = time.monotonic() + LLM_RETRY_COOLDOWN_S
         print(f"[WARN] Ollama LLM summarization failed: {e}")
         print(f"[INFO] Make sure Ollama is running: open -a Ollama")
         print(f"[INFO] Check model is available: ollama list")
         # Fallback to simple formatting
         return _format_rag_snippets_simple(rag_snippets)
+    except Exception as e:
+        # Bad reply (e.g. empty content): fall back for this request only
+        print(f"[WARN] Ollama LLM summarization failed: {e}")
+        return _format_rag_snippets_simple(rag_snippets)
 
 
 def _format_rag_snippets_simple(snippets: List[Dict[str, Any]]) -> str:
@@ -2,6 +2,7 @@
 from __future__ import annotations
 import os
 import re
+import functools
 from typing import Any, Dict, List, Optional
 import json
 
@@ -38,6 +39,12 @@ SITE_URL = "https://parks-maintenance-system.local"  # Your site URL
 SITE_NAME = "Parks Maintenance Intelligence System"  # Your app name
 
 
+@functools.cache
+def _get_client() -> "OpenAI":
+    """One OpenRouter client per process so its HTTP connection pool is reused."""
+    return OpenAI(base_url=OPENROUTER_BASE_URL, api_key=OPENROUTER_API_KEY)
+
+
 def assess_field_condition_vlm(
     image_uri: str,
     user_query: str = "",
@@ -104,10 +111,7 @@ Provide response in this JSON format:
         base_prompt += rag_info
         
         # Call VLM via OpenRouter (Claude 3 Haiku)
-        client = OpenAI(
-            base_url=OPENROUTER_BASE_URL,
-            api_key=OPENROUTER_API_KEY
-        )
+        client = _get_client()
         
         print(f"[VLM] Calling model: {VLM_MODEL}")
         
@@ -210,10 +214,7 @@ Provide detailed analysis in JSON format:
   "reasoning": "explanation of how you identified this"
 }}"""
 
-        client = OpenAI(
-            base_url=OPENROUTER_BASE_URL,
-            api_key=OPENROUTER_API_KEY
-        )
+        client = _get_client()
         
         response = client.chat.completions.create(
             extra_headers={
@@ -297,10 +298,7 @@ Provide assessment in JSON:
 }}"""
     
     try:
-        client = OpenAI(
-            base_url=OPENROUTER_BASE_URL,
-            api_key=OPENROUTER_API_KEY
-        )
+        client = _get_client()
         
         response = client.chat.completions.create(
             extra_headers={
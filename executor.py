@@ -1,5 +1,6 @@
 from __future__ import annotations
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
 from rag import kb_retrieve, sop_extract
@@ -23,10 +24,18 @@ TOOL_REGISTRY = {
 if CV_AVAILABLE:
     TOOL_REGISTRY["cv_assess_rag"] = cv_assess_rag
 
+def _timed_call(fn, args: Dict[str, Any]):
+    t0 = time.time()
+    out = fn(**args)
+    return out, int((time.time() - t0) * 1000)
+
 
 def execute_plan(plan: List[Dict[str, Any]], slots: Dict[str, Any]) -> Dict[str, Any]:
     """
     Execute a list of tool calls in sequence and accumulate evidence.
+    When a plan has both retrieval and SQL steps, kb_retrieve runs in a
+    per-request worker thread while the SQL runs on the calling thread;
+    results are still applied in plan order.
     
     Args:
         plan: List of steps, each with {"tool": str, "args": dict}
@@ -48,15 +57,37 @@ def execute_plan(plan: List[Dict[str, Any]], slots: Dict[str, Any]) -> Dict[str,
         "logs": [],
     }
     
-    for step in plan:
+    # kb_retrieve and sql_query_rag read only their own args, never earlier
+    # evidence, so both can start before the loop consumes them
+    retrievals, sql_runs = {}, {}
+    kb_idx = [i for i, step in enumerate(plan) if step["tool"] == "kb_retrieve"]
+    sql_idx = [i for i, step in enumerate(plan) if step["tool"] == "sql_query_rag"]
+    if kb_idx and sql_idx:
+        pool = ThreadPoolExecutor(max_workers=len(kb_idx), thread_name_prefix="kb-prefetch")
+        for i in kb_idx:
+            retrievals[i] = pool.submit(
+                _timed_call, TOOL_REGISTRY["kb_retrieve"], plan[i].get("args", {}) or {}
+            )
+        pool.shutdown(wait=False)  # submitted retrievals still run to completion
+        for i in sql_idx:
+            try:
+                sql_runs[i] = _timed_call(TOOL_REGISTRY["sql_query_rag"], plan[i].get("args", {}) or {})
+            except Exception as e:
+                sql_runs[i] = e  # re-raised when the loop reaches this step
+    
+    for i, step in enumerate(plan):
         tool = step["tool"]
         args = step.get("args", {}) or {}
         t0 = time.time()
+        step_ms = None
         
         try:
             if tool == "kb_retrieve":
-                # Retrieve documents from knowledge base
-                out = TOOL_REGISTRY[tool](**args)
+                # Retrieve documents from knowledge base (or collect the prefetched run)
+                if i in retrievals:
+                    out, step_ms = retrievals[i].result()
+                else:
+                    out = TOOL_REGISTRY[tool](**args)
                 state["evidence"]["kb_hits"] = out.get("hits", [])
                 ok, err = True, None
                 
@@ -73,8 +104,13 @@ def execute_plan(plan: List[Dict[str, Any]], slots: Dict[str, Any]) -> Dict[str,
                 ok, err = True, None
                 
             elif tool == "sql_query_rag":
-                # Execute SQL query template
-                out = TOOL_REGISTRY[tool](**args)
+                # Execute SQL query template (or collect the early run)
+                if i in sql_runs:
+                    if isinstance(sql_runs[i], Exception):
+                        raise sql_runs[i]
+                    out, step_ms = sql_runs[i]
+                else:
+                    out = TOOL_REGISTRY[tool](**args)
                 
                 # Store SQL results
                 state["evidence"]["sql"] = {
@@ -118,7 +154,7 @@ def execute_plan(plan: List[Dict[str, Any]], slots: Dict[str, Any]) -> Dict[str,
             print(f"[ERROR] Tool '{tool}' failed: {err}")
         
         # Log this step's execution
-        elapsed_ms = int((time.time() - t0) * 1000)
+        elapsed_ms = step_ms if step_ms is not None else int((time.time() - t0) * 1000)
         state["logs"].append({
             "tool": tool,
             "args_redacted": list(args.keys()),
@@ -1,13 +1,81 @@
 # nlu.py
 from __future__ import annotations
+import logging
+import os
 import re
+import threading
 from dataclasses import dataclass
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Callable, TypedDict
+
+# ---------- CPU thread pools ----------
+# Cap intra-op threads at 8 (MiniLM peaks around 4-8) and keep a single
+# inter-op thread. The core count is psutil's physical cores when installed;
+# otherwise the CPUs this process may run on (affinity mask), which counts SMT
+# siblings but respects container/taskset limits. The BLAS env vars must be
+# set before numpy loads. Downstream code should not override these settings.
+try:
+    import psutil
+    _CPU_CORES = psutil.cpu_count(logical=False)
+except ImportError:
+    _CPU_CORES = None
+if not _CPU_CORES:
+    try:
+        _CPU_CORES = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        _CPU_CORES = os.cpu_count() or 4
+_N_THREADS = min(8, _CPU_CORES)
+os.environ.setdefault("OMP_NUM_THREADS", str(_N_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(_N_THREADS))
+
+import torch
+
+torch.set_num_threads(_N_THREADS)
+try:
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    pass  # inter-op pool already started; only the first call can set it
 
 from sentence_transformers import SentenceTransformer, util
 
+# Per-request routing traces go to DEBUG (off by default) instead of stdout,
+# so the message is only formatted when someone enables it.
+log = logging.getLogger(__name__)
+
+
 # ---------- MiniLM encoder ----------
-_ENCODER = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+# The app's sync endpoints run in FastAPI's threadpool, so concurrent first
+# requests race to load; the re-entrant lock lets the prototype loader call
+# _get_encoder while holding it.
+_ENCODER: Optional[SentenceTransformer] = None
+_PROTOTYPE_EMB = None
+_LOAD_LOCK = threading.RLock()
+
+
+def _get_encoder() -> SentenceTransformer:
+    """Load the MiniLM encoder exactly once per process."""
+    global _ENCODER
+    if _ENCODER is None:
+        with _LOAD_LOCK:
+            if _ENCODER is None:
+                _ENCODER = _load_encoder()
+    return _ENCODER
+
+
+def _load_encoder() -> SentenceTransformer:
+    encoder = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+
+    # GPU: run the forward pass in FP16. CPU: swap in BetterTransformer's fused
+    # attention kernels when optimum is installed, otherwise keep the FP32 model.
+    if torch.cuda.is_available():
+        encoder = encoder.to("cuda").half()
+    else:
+        try:
+            from optimum.bettertransformer import BetterTransformer
+            encoder[0].auto_model = BetterTransformer.transform(encoder[0].auto_model)
+        except Exception as e:
+            print(f"[NLU] BetterTransformer not enabled, using default CPU encoder: {e}")
+    return encoder
+
 
 # ---------- Few-shot prototypes ----------
 INTENT_PROTOTYPES = {
@@ -59,14 +127,23 @@ INTENT_PROTOTYPES = {
     ],
 }
 
-# Pre-encode prototypes
+# Flatten prototypes; embeddings are computed lazily on first classification
 _PROT_TEXTS: List[str] = []
 _PROT_LABELS: List[str] = []
 for label, samples in INTENT_PROTOTYPES.items():
     for s in samples:
         _PROT_TEXTS.append(s)
         _PROT_LABELS.append(label)
-_PROT_EMB = _ENCODER.encode(_PROT_TEXTS, normalize_embeddings=True)
+
+
+def _get_prototype_emb():
+    """Encode the few-shot prototypes once, on first use."""
+    global _PROTOTYPE_EMB
+    if _PROTOTYPE_EMB is None:
+        with _LOAD_LOCK:
+            if _PROTOTYPE_EMB is None:
+                _PROTOTYPE_EMB = _get_encoder().encode(_PROT_TEXTS, normalize_embeddings=True)
+    return _PROTOTYPE_EMB
 
 # ---------- month/year & park parsing ----------
 _MONTHS = {
@@ -80,52 +157,59 @@ _MONTHS = {
     )
 }
 _MONTH_ABBR = {k[:3]: v for k, v in _MONTHS.items()}
+# Full names and abbreviations in one lookup / one alternation (longest first,
+# so "march" wins over "mar" at the same position)
+_MONTH_LOOKUP = {**_MONTH_ABBR, **_MONTHS}
+_MONTH_ALT = "|".join(sorted(_MONTH_LOOKUP, key=len, reverse=True))
+_MONTH_ANY_PAT = re.compile(rf"\b({_MONTH_ALT})\b")
+_IN_MONTH_PAT = re.compile(rf"\bin\s+({_MONTH_ALT})\b")
+_YEAR_MONTH_PAT = re.compile(r"\b(20\d{2})-(\d{1,2})\b")
+_MONTH_RANGE_PAT = re.compile(
+    r"(?:from|between)\s+([a-zA-Z]+)\s+(?:to|and)\s+([a-zA-Z]+)\s*(20\d{2})?"
+)
+_YEAR_PAT = re.compile(r"\b(20\d{2})\b")
+_WORD_PAT = re.compile(r"[a-z]+")
+
+# "in/at/for <up to 4 words> park". Matching whole, bounded words keeps long
+# inputs such as "in in in ..." from backtracking quadratically.
+_PARK_PAT = re.compile(r"(?:in|at|for)\s+((?:[a-z][a-z\-\&]*\s+){1,4}(?:park|pk))\b")
+
+_KNOWN_PARKS = frozenset([
+    "alice town", "cambridge", "garden", "grandview",
+    "mcgill", "mcspadden", "mosaic creek", "cariboo",
+    "john hendry", "hastings", "new brighton",
+])
+_KNOWN_PARKS_MAX_WORDS = max(len(p.split()) for p in _KNOWN_PARKS)
 
 
 def _norm(s: Optional[str]) -> str:
     return (s or "").strip().lower()
 
 
-def _parse_month_year(text: str) -> Tuple[Optional[int], Optional[int]]:
-    t = _norm(text).replace(",", " ")
+def _parse_month_year(lowq: str) -> Tuple[Optional[int], Optional[int]]:
+    """Expects an already-normalized query (see `_norm`)."""
+    t = lowq.replace(",", " ")
     # YYYY-MM
-    m = re.search(r"\b(20\d{2})-(\d{1,2})\b", t)
+    m = _YEAR_MONTH_PAT.search(t)
     if m:
         y, mo = int(m.group(1)), int(m.group(2))
         if 1 <= mo <= 12:
             return mo, y
 
-    # full month
-    for name, idx in _MONTHS.items():
-        if re.search(rf"\b{name}\b", t):
-            mo = idx
-            y = None
-            yy = re.search(r"\b(20\d{2})\b", t)
-            if yy:
-                y = int(yy.group(1))
-            return mo, y
-
-    # abbr month (Apr, Jun...)
-    for abbr, idx in _MONTH_ABBR.items():
-        if re.search(rf"\b{abbr}\b", t):
-            mo = idx
-            y = None
-            yy = re.search(r"\b(20\d{2})\b", t)
-            if yy:
-                y = int(yy.group(1))
-            return mo, y
+    # month name or abbr (April, Apr...), first mention wins
+    mm = _MONTH_ANY_PAT.search(t)
+    yy = _YEAR_PAT.search(t)
+    y = int(yy.group(1)) if yy else None
+    if mm:
+        return _MONTH_LOOKUP[mm.group(1)], y
 
-    # only year
-    yy = re.search(r"\b(20\d{2})\b", t)
-    if yy:
-        return None, int(yy.group(1))
+    # only year (or nothing)
+    return None, y
 
-    return None, None
 
-
-def _parse_month_range(text: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
+def _parse_month_range(lowq: str) -> Tuple[Optional[int], Optional[int], Optional[int]]:
     """
-    Parse month range or single month
+    Parse month range or single month from an already-normalized query
     Returns: (start_month, end_month, year)
     
     Supports:
@@ -133,13 +217,8 @@ def _parse_month_range(text: str) -> Tuple[Optional[int], Optional[int], Optiona
     - "in June 2025" -> (6, 6, 2025)  # single month
     - "trend in March" -> (3, 3, None)
     """
-    t = _norm(text)
-    
     # Pattern 1: explicit range "from X to Y"
-    m = re.search(
-        r"(?:from|between)\s+([a-zA-Z]+)\s+(?:to|and)\s+([a-zA-Z]+)\s*(20\d{2})?",
-        t,
-    )
+    m = _MONTH_RANGE_PAT.search(lowq)
     if m:
         m1, m2 = m.group(1).lower(), m.group(2).lower()
         y = int(m.group(3)) if m.group(3) else None
@@ -151,74 +230,100 @@ def _parse_month_range(text: str) -> Tuple[Optional[int], Optional[int], Optiona
         return _to_month(m1), _to_month(m2), y
     
     # Pattern 2: single month "in June 2025" or "trend in March"
-    for name, idx in _MONTHS.items():
-        if re.search(rf"\bin\s+{name}\b", t):
-            yy = re.search(r"\b(20\d{2})\b", t)
-            y = int(yy.group(1)) if yy else None
-            return idx, idx, y
-    
-    for abbr, idx in _MONTH_ABBR.items():
-        if re.search(rf"\bin\s+{abbr}\b", t):
-            yy = re.search(r"\b(20\d{2})\b", t)
-            y = int(yy.group(1)) if yy else None
-            return idx, idx, y
+    mm = _IN_MONTH_PAT.search(lowq)
+    if mm:
+        idx = _MONTH_LOOKUP[mm.group(1)]
+        yy = _YEAR_PAT.search(lowq)
+        y = int(yy.group(1)) if yy else None
+        return idx, idx, y
     
     return None, None, None
 
 
-def _parse_park(text: str) -> Optional[str]:
-    """Enhanced park name extraction"""
-    t = _norm(text)
-    
+def _parse_park(lowq: str, words: Optional[List[str]] = None) -> Optional[str]:
+    """Enhanced park name extraction (expects an already-normalized query)"""
     # Pattern 1: "in XXX Park" / "at XXX Park"
-    m = re.search(r"(?:in|at|for)\s+([a-z][a-z\s\-\&]+(?:park|pk))\b", t)
+    m = _PARK_PAT.search(lowq)
     if m:
         park_raw = m.group(1).strip()
         park_clean = park_raw.replace(" park", "").replace(" pk", "").strip()
         return park_clean.title()
     
-    # Pattern 2: known park names
-    known_parks = [
-        "alice town", "cambridge", "garden", "grandview", 
-        "mcgill", "mcspadden", "mosaic creek", "cariboo",
-        "john hendry", "hastings", "new brighton"
-    ]
-    for park in known_parks:
-        if park in t:
-            return park.title()
+    # Pattern 2: known park names (1- and 2-word windows over the query tokens)
+    toks = words if words is not None else _WORD_PAT.findall(lowq)
+    for i in range(len(toks)):
+        for n in range(1, _KNOWN_PARKS_MAX_WORDS + 1):
+            cand = " ".join(toks[i:i + n])
+            if cand in _KNOWN_PARKS:
+                return cand.title()
     
     return None
 
 
-def _detect_domain(text: str) -> str:
-    """Detect domain: mowing / field_standards / generic"""
-    t = _norm(text)
-    
+def _detect_domain(lowq: str) -> str:
+    """Detect domain: mowing / field_standards / generic (expects normalized query)"""
     # Mowing domain
-    if any(k in t for k in ["mowing", "mow", "turf", "grass", "lawn"]):
+    if any(k in lowq for k in ["mowing", "mow", "turf", "grass", "lawn"]):
         return "mowing"
     
     # Field standards domain
-    if any(k in t for k in ["soccer", "baseball", "softball", "cricket", "football", "rugby", "lacrosse", "field", "dimensions", "pitching", "u10", "u11", "u12", "u13", "u14", "u15", "u16", "u17", "u18"]):
+    if any(k in lowq for k in ["soccer", "baseball", "softball", "cricket", "football", "rugby", "lacrosse", "field", "dimensions", "pitching", "u10", "u11", "u12", "u13", "u14", "u15", "u16", "u17", "u18"]):
         return "field_standards"
     
     return "generic"
 
 
-@dataclass
+# ---------- mowing template routing ----------
+_FROM_TO_PAT = re.compile(r"\bfrom\s+\w+\s+to\s+\w+")
+
+# (predicate(lowq), template) in priority order: most specific first.
+# Keywords are substring checks on purpose, so stems also match their
+# inflections ("costs", "topped", "trended", "mowed", "comparisons").
+_MOWING_TEMPLATE_RULES: List[Tuple[Callable[[str], Any], str]] = [
+    (lambda lowq: "cost" in lowq
+        and any(k in lowq for k in ("highest", "top", "max", "most expensive")),
+     "mowing.labor_cost_month_top1"),
+    (lambda lowq: "mow" in lowq
+        and any(k in lowq for k in ("last", "recent", "latest", "when was")),
+     "mowing.last_mowing_date"),
+    (lambda lowq: "cost" in lowq and "trend" in lowq,
+     "mowing.cost_trend"),
+    (lambda lowq: "cost" in lowq and _FROM_TO_PAT.search(lowq),
+     "mowing.cost_trend"),
+    (lambda lowq: "cost" in lowq
+        and any(k in lowq for k in ("compar", "across", "all parks")),
+     "mowing.cost_by_park_month"),
+    (lambda lowq: any(k in lowq for k in ("breakdown", "detail", "break down")),
+     "mowing.cost_breakdown"),
+    (lambda lowq: "by park" in lowq or "each park" in lowq,
+     "mowing.cost_by_park_month"),
+]
+
+
+@dataclass(slots=True, frozen=True)
 class NLUResult:
     intent: str
     confidence: float
     slots: Dict[str, Any]
     template_hint: Optional[str]
+    normalized_query: str = ""
+
+
+class NLUOutput(TypedDict):
+    intent: str
+    confidence: float
+    slots: Dict[str, Any]
+    route_plan: List[Dict[str, Any]]
+    clarifications: List[str]
 
 
 def classify_intent_and_slots(
     text: str, image_uri: Optional[str] = None
 ) -> NLUResult:
     q = text.strip()
-    q_emb = _ENCODER.encode([q], normalize_embeddings=True)
-    sims = util.cos_sim(q_emb, _PROT_EMB).cpu().tolist()[0]
+    lowq = q.lower()
+    q_emb = _get_encoder().encode([q], normalize_embeddings=True)
+    sims = util.cos_sim(q_emb, _get_prototype_emb()).cpu().tolist()[0]
 
     # TOP-1 prototype
     best_i = max(range(len(sims)), key=lambda i: sims[i])
@@ -226,27 +331,28 @@ def classify_intent_and_slots(
     best_score = float(sims[best_i])
 
     # CRITICAL: Only use CV if image is actually uploaded
-    print(f"[NLU-DEBUG] Initial intent from similarity: {best_label}")
-    print(f"[NLU-DEBUG] Image URI provided: {image_uri}")
+    log.debug("Initial intent from similarity: %s", best_label)
+    log.debug("Image URI provided: %s", image_uri)
     
     if image_uri:
-        print(f"[NLU-DEBUG] Image detected, adding CV to intent")
+        log.debug("Image detected, adding CV to intent")
         if "RAG" in best_label or "SQL" in best_label:
             best_label = "RAG+CV_tool"
         else:
             best_label = "CV_tool"
     else:
         if "CV" in best_label:
-            print(f"[NLU-DEBUG] No image but CV intent detected, forcing to RAG")
+            log.debug("No image but CV intent detected, forcing to RAG")
             best_label = "RAG"
     
-    print(f"[NLU-DEBUG] Final intent after image check: {best_label}")
+    log.debug("Final intent after image check: %s", best_label)
 
     # Extract entities
-    domain = _detect_domain(q)
-    month, year = _parse_month_year(q)
-    s_m, e_m, r_y = _parse_month_range(q)
-    park = _parse_park(q)
+    domain = _detect_domain(lowq)
+    month, year = _parse_month_year(lowq)
+    s_m, e_m, r_y = _parse_month_range(lowq)
+    words = _WORD_PAT.findall(lowq)
+    park = _parse_park(lowq, words)
 
     slots: Dict[str, Any] = {
         "domain": domain,
@@ -261,47 +367,75 @@ def classify_intent_and_slots(
 
     # -------- Template routing --------
     template_hint = None
-    lowq = _norm(q)
     
     if domain == "mowing":
-        # Priority order: most specific patterns first
-        if any(k in lowq for k in ["highest", "top", "max", "most expensive"]) and "cost" in lowq:
-            template_hint = "mowing.labor_cost_month_top1"
-        elif any(k in lowq for k in ["last", "recent", "latest", "when was"]) and any(k in lowq for k in ["mow", "mowing"]):
-            template_hint = "mowing.last_mowing_date"
-        elif "trend" in lowq and "cost" in lowq:
-            template_hint = "mowing.cost_trend"
-        elif re.search(r'\bfrom\s+\w+\s+to\s+\w+', lowq) and "cost" in lowq:
-            template_hint = "mowing.cost_trend"
-        elif any(k in lowq for k in ["compare", "across", "all parks"]) and "cost" in lowq:
-            template_hint = "mowing.cost_by_park_month"
-        elif any(k in lowq for k in ["breakdown", "detail", "break down"]):
-            template_hint = "mowing.cost_breakdown"
-        elif "by park" in lowq or "each park" in lowq:
-            template_hint = "mowing.cost_by_park_month"
+        for pred, tmpl in _MOWING_TEMPLATE_RULES:
+            if pred(lowq):
+                template_hint = tmpl
+                break
 
     # RAG-only triggers - force RAG for informational queries
     if any(k in lowq for k in ["steps", "procedure", "safety", "manual", "how to", "sop",
                                 "dimensions", "requirements", "standards", "what are", "show me", "tell me"]):
         if "SQL" not in best_label and not image_uri:
-            print(f"[NLU-DEBUG] RAG keywords detected, forcing to RAG")
+            log.debug("RAG keywords detected, forcing to RAG")
             best_label = "RAG"
 
-    print(f"[NLU] Query: '{q}'")
-    print(f"[NLU] Domain: {domain}")
-    print(f"[NLU] Intent: {best_label} (confidence: {best_score:.3f})")
-    print(f"[NLU] Slots: {slots}")
-    print(f"[NLU] Template hint: {template_hint}")
-    print(f"[NLU] Image uploaded: {'Yes' if image_uri else 'No'}")
+    log.debug("Query: '%s'", q)
+    log.debug("Domain: %s", domain)
+    log.debug("Intent: %s (confidence: %.3f)", best_label, best_score)
+    log.debug("Slots: %s", slots)
+    log.debug("Template hint: %s", template_hint)
+    log.debug("Image uploaded: %s", 'Yes' if image_uri else 'No')
 
     return NLUResult(
         intent=best_label,
         confidence=round(best_score, 3),
         slots=slots,
         template_hint=template_hint,
+        normalized_query=lowq,
     )
 
 
+# ---------- static route plan steps ----------
+# Steps that never depend on the query are built once as plain dicts and
+# appended to every plan as-is. They are shared between requests, so treat
+# them as read-only (executor.py only reads kb_retrieve/sop_extract args).
+def _kb_step(query: str, top_k: int) -> Dict[str, Any]:
+    return {"tool": "kb_retrieve", "args": {"query": query, "top_k": top_k}}
+
+
+_SOP_EXTRACT_STEP = {
+    "tool": "sop_extract",
+    "args": {"schema": ["steps", "materials", "tools", "safety"]},
+}
+_RAG_FIELD_PLAN = (
+    _kb_step("field dimensions standards age group requirements length width pitching distance soccer baseball softball", 5),
+    _SOP_EXTRACT_STEP,
+)
+_RAG_MOWING_PLAN = (
+    _kb_step("mowing standard safety equipment frequency lane kilometer pricing", 5),
+    _SOP_EXTRACT_STEP,
+)
+_KB_COST_STEP = _kb_step("mowing cost labor standard pricing rate", 3)
+_KB_TURF_STEP = _kb_step("turf inspection maintenance repair standards", 3)
+
+_FIELD_QUERY_KEYWORDS = (
+    "dimension", "size", "requirement", "standard", "soccer", "baseball", "softball",
+    "cricket", "football", "rugby", "field", "u10", "u11", "u12", "u13", "u14", "u15",
+    "u16", "u17", "u18", "pitching", "distance",
+)
+
+
+def _sql_params(slots: Dict[str, Any]) -> Dict[str, Any]:
+    """Base SQL template params shared by the SQL and RAG+SQL plans"""
+    return {
+        "month": slots.get("month"),
+        "year": slots.get("year"),
+        "park_name": slots.get("park_name"),
+    }
+
+
 def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Dict[str, Any]]:
     """Build tool execution plan based on NLU result"""
     plan: List[Dict[str, Any]] = []
@@ -311,48 +445,28 @@ def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Di
     
     # CRITICAL FIX: Force remove CV if no image
     if "CV" in intent and not slots.get("image_uri"):
-        print(f"[NLU] WARNING: CV intent detected but no image provided, forcing to RAG")
-        if intent == "RAG+CV_tool":
-            intent = "RAG"
-        elif intent == "CV_tool":
-            intent = "RAG"
+        log.debug("CV intent detected but no image provided, forcing to RAG")
+        intent = "RAG"
 
     if intent == "RAG":
         # Detect query type for better keyword selection
-        q_lower = _norm(original_query or "")
+        q_lower = nlu_result.normalized_query or _norm(original_query)
         
         # Field dimensions query
-        if any(k in q_lower for k in ["dimension", "size", "requirement", "standard", "soccer", "baseball", "softball", "cricket", "football", "rugby", "field", "u10", "u11", "u12", "u13", "u14", "u15", "u16", "u17", "u18", "pitching", "distance"]):
-            query_keywords = "field dimensions standards age group requirements length width pitching distance soccer baseball softball"
-            print(f"[NLU] Detected FIELD DIMENSIONS query")
+        if any(k in q_lower for k in _FIELD_QUERY_KEYWORDS):
+            rag_plan = _RAG_FIELD_PLAN
+            log.debug("Detected FIELD DIMENSIONS query")
         else:
             # Mowing procedures query
-            query_keywords = "mowing standard safety equipment frequency lane kilometer pricing"
-            print(f"[NLU] Detected MOWING PROCEDURES query")
+            rag_plan = _RAG_MOWING_PLAN
+            log.debug("Detected MOWING PROCEDURES query")
         
-        plan.append({
-            "tool": "kb_retrieve",
-            "args": {
-                "query": query_keywords,
-                "top_k": 5
-            }
-        })
-        plan.append({
-            "tool": "sop_extract",
-            "args": {
-                "schema": ["steps", "materials", "tools", "safety"]
-            }
-        })
-        print(f"[NLU] Plan: RAG workflow (keywords='{query_keywords}')")
+        plan.extend(rag_plan)
+        log.debug("Plan: RAG workflow (keywords='%s')", rag_plan[0]['args']['query'])
 
     elif intent == "SQL_tool":
         template = template_hint or "mowing.labor_cost_month_top1"
-        
-        params = {
-            "month": slots.get("month"),
-            "year": slots.get("year"),
-            "park_name": slots.get("park_name"),
-        }
+        params = _sql_params(slots)
         
         if template == "mowing.cost_trend":
             params["year"] = slots.get("range_year") or slots.get("year")
@@ -367,23 +481,13 @@ def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Di
                 "params": params
             }
         })
-        print(f"[NLU] Plan: SQL workflow (template={template}, params={params})")
+        log.debug("Plan: SQL workflow (template=%s, params=%s)", template, params)
 
     elif intent == "RAG+SQL_tool":
-        plan.append({
-            "tool": "kb_retrieve",
-            "args": {
-                "query": "mowing cost labor standard pricing rate",
-                "top_k": 3
-            }
-        })
+        plan.append(_KB_COST_STEP)
         
         template = template_hint or "mowing.labor_cost_month_top1"
-        params = {
-            "month": slots.get("month"),
-            "year": slots.get("year"),
-            "park_name": slots.get("park_name"),
-        }
+        params = _sql_params(slots)
         
         plan.append({
             "tool": "sql_query_rag",
@@ -392,7 +496,7 @@ def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Di
                 "params": params
             }
         })
-        print(f"[NLU] Plan: RAG+SQL workflow (kb_retrieve + template={template})")
+        log.debug("Plan: RAG+SQL workflow (kb_retrieve + template=%s)", template)
 
     elif intent == "CV_tool":
         plan.append({
@@ -402,16 +506,10 @@ def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Di
                 "topic_hint": "turf wear disease inspection guidelines"
             }
         })
-        print(f"[NLU] Plan: CV workflow (cv_assess_rag)")
+        log.debug("Plan: CV workflow (cv_assess_rag)")
 
     elif intent == "RAG+CV_tool":
-        plan.append({
-            "tool": "kb_retrieve",
-            "args": {
-                "query": "turf inspection maintenance repair standards",
-                "top_k": 3
-            }
-        })
+        plan.append(_KB_TURF_STEP)
         plan.append({
             "tool": "cv_assess_rag",
             "args": {
@@ -419,12 +517,12 @@ def build_route_plan(nlu_result: NLUResult, original_query: str = "") -> List[Di
                 "topic_hint": "turf wear disease inspection guidelines"
             }
         })
-        print(f"[NLU] Plan: RAG+CV workflow (kb_retrieve + cv_assess_rag)")
+        log.debug("Plan: RAG+CV workflow (kb_retrieve + cv_assess_rag)")
 
     return plan
 
 
-def nlu_parse(text: str, image_uri: Optional[str] = None) -> Dict[str, Any]:
+def nlu_parse(text: str, image_uri: Optional[str] = None) -> NLUOutput:
     """
     Main entry: parse user input, return intent, slots, and execution plan
     
@@ -443,11 +541,8 @@ def nlu_parse(text: str, image_uri: Optional[str] = None) -> Dict[str, Any]:
     # CRITICAL FIX: Final check for CV without image
     final_intent = nlu_result.intent
     if "CV" in final_intent and not image_uri:
-        print(f"[NLU] FINAL CHECK: Removing CV from intent (no image)")
-        if final_intent == "RAG+CV_tool":
-            final_intent = "RAG"
-        elif final_intent == "CV_tool":
-            final_intent = "RAG"
+        log.debug("FINAL CHECK: Removing CV from intent (no image)")
+        final_intent = "RAG"
     
     # Generate clarifications
     clarifications = []
@@ -1,6 +1,7 @@
 from __future__ import annotations
-import os, glob, re
+import os, glob, re, bisect, threading, json, functools
 from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from config import RAG_DOC_DIR, FAISS_DIR, NUMPY_AVAILABLE
 
 # LangChain bits
@@ -9,6 +10,166 @@ from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import FAISS
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.embeddings import Embeddings
+
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+EMB_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMB_BATCH_SIZE = 64
+
+# Store layout by corpus size: exact flat L2 for small stores, int8 scalar
+# quantization (4x smaller vectors) from SQ8_MIN_CHUNKS, and IVF-PQ (coarse
+# lists + 8-bit product codes) from IVFPQ_MIN_CHUNKS.
+SQ8_MIN_CHUNKS = 1000
+IVFPQ_MIN_CHUNKS = 10_000  # PQ training wants ~39 x 256 vectors
+IVFPQ_M = 48        # sub-quantizers; must divide the 384-d MiniLM vectors
+IVFPQ_NPROBE = 8
+
+
+# Per-file "mtime:size" signatures of the docs the saved index was built from
+CORPUS_MANIFEST = "corpus.json"
+
+
+def _file_sig(path: str) -> str:
+    return f"{os.path.getmtime(path)}:{os.path.getsize(path)}"
+
+
+def _split_docs(docs):
+    splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
+    return splitter.split_documents(docs)
+
+
+def _make_embeddings() -> HuggingFaceEmbeddings:
+    """
+    MiniLM embedder; on CUDA the weights are cast to fp16 (same as the NLU encoder).
+    sentence-transformers already length-sorts each encode() call before
+    batching, so index builds only need a larger batch to cut padding overhead.
+    """
+    import torch  # already loaded by sentence-transformers
+    encode_kwargs = {"batch_size": EMB_BATCH_SIZE}
+    if torch.cuda.is_available():
+        emb = HuggingFaceEmbeddings(
+            model_name=EMB_MODEL, model_kwargs={"device": "cuda"}, encode_kwargs=encode_kwargs
+        )
+        emb.client.half()
+        return emb
+    return HuggingFaceEmbeddings(model_name=EMB_MODEL, encode_kwargs=encode_kwargs)
+
+
+def _compress_index(flat):
+    """
+    Re-pack an L2 index according to its size, keeping the same ids and
+    metric so the docstore mapping and score semantics hold. Indexes already
+    at the right tier (or at IVF-PQ) come back unchanged, so this is also
+    run after incremental adds to move a grown index up a tier.
+    """
+    import faiss
+    n = flat.ntotal
+    if n < SQ8_MIN_CHUNKS or isinstance(flat, faiss.IndexIVF):
+        return flat
+    if n < IVFPQ_MIN_CHUNKS and isinstance(flat, faiss.IndexScalarQuantizer):
+        return flat
+    vecs = flat.reconstruct_n(0, n)
+    if n < IVFPQ_MIN_CHUNKS:
+        index = faiss.IndexScalarQuantizer(flat.d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+        label = "int8 scalar-quantized"
+    else:
+        nlist = max(1, int(n ** 0.5))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(flat.d), flat.d, nlist, IVFPQ_M, 8)
+        index.nprobe = IVFPQ_NPROBE  # persisted by write_index
+        label = f"IVF-PQ ({nlist} lists)"
+    index.train(vecs)
+    index.add(vecs)
+    print(f"[RAG] Compressed {n} vectors to {label} index")
+    return index
+
+
+class _LazyEmbeddings(Embeddings):
+    """
+    Stand-in for HuggingFaceEmbeddings that loads the model on first embed.
+    Loading a saved FAISS index only needs an embedder at query time, so boot
+    with a cached index no longer pays for the model up front.
+    """
+    def __init__(self):
+        self._emb: Optional[HuggingFaceEmbeddings] = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> HuggingFaceEmbeddings:
+        if self._emb is None:
+            with self._lock:
+                if self._emb is None:
+                    print(f"[RAG] Loading embedding model {EMB_MODEL}")
+                    self._emb = _make_embeddings()
+        return self._emb
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._get().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._get().embed_query(text)
+
+
+class _SparseBM25:
+    """
+    Okapi BM25 over an inverted index (term -> doc ids + precomputed weights).
+    Same scores as LangChain's BM25Retriever (rank_bm25.BM25Okapi over
+    whitespace tokens), but a query only touches the postings of its own terms
+    instead of looping over every document in Python for every term.
+    """
+    def __init__(self, docs, k: int = 4, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        import math
+        import numpy as np
+        self.docs = docs
+        self.k = k
+
+        tfs = []
+        df: Dict[str, int] = {}
+        for d in docs:
+            counts: Dict[str, int] = {}
+            for tok in d.page_content.split():
+                counts[tok] = counts.get(tok, 0) + 1
+            tfs.append(counts)
+            for tok in counts:
+                df[tok] = df.get(tok, 0) + 1
+
+        n_docs = len(docs)
+        doc_len = np.array([sum(c.values()) for c in tfs], dtype=float)
+        avgdl = doc_len.sum() / n_docs
+        norm = k1 * (1 - b + b * doc_len / avgdl)
+
+        # idf with rank_bm25's floor for terms present in over half the docs
+        idf = {t: math.log(n_docs - f + 0.5) - math.log(f + 0.5) for t, f in df.items()}
+        eps = epsilon * (sum(idf.values()) / len(idf))
+        idf = {t: (eps if v < 0 else v) for t, v in idf.items()}
+
+        ids: Dict[str, List[int]] = {}
+        freqs: Dict[str, List[int]] = {}
+        for i, counts in enumerate(tfs):
+            for tok, c in counts.items():
+                ids.setdefault(tok, []).append(i)
+                freqs.setdefault(tok, []).append(c)
+        self._postings = {}
+        for tok, doc_ids in ids.items():
+            doc_ids = np.array(doc_ids, dtype=np.int64)
+            tf = np.array(freqs[tok], dtype=float)
+            self._postings[tok] = (doc_ids, idf[tok] * (tf * (k1 + 1) / (tf + norm[doc_ids])))
+        self._n_docs = n_docs
+        self._np = np
+
+    def get_relevant_documents(self, query: str):
+        np = self._np
+        scores = np.zeros(self._n_docs)
+        for tok in query.split():
+            hit = self._postings.get(tok)
+            if hit is not None:
+                np.add.at(scores, hit[0], hit[1])
+        top = np.argsort(scores)[::-1][:self.k]
+        return [self.docs[i] for i in top]
+
 
 class RAGIndex:
     """
@@ -25,66 +186,156 @@ class RAGIndex:
         self.retriever = None
         self._ensure_index()
 
-    def _load_docs(self):
-        """Load both PDF and TXT files from doc directory"""
-        docs = []
-        
-        # Load PDFs
+    def _doc_paths(self) -> List[str]:
+        """PDF and TXT files in the doc directory (PDFs first, each sorted)"""
         pdfs = sorted(glob.glob(os.path.join(self.doc_dir, "*.pdf")))
-        for p in pdfs:
+        txts = sorted(glob.glob(os.path.join(self.doc_dir, "*.txt")))
+        return pdfs + txts
+
+    @staticmethod
+    def _load_one(p: str):
+        """Load a single PDF or TXT file; failures are logged and yield no docs"""
+        if p.endswith(".pdf"):
             try:
                 loaded = PyPDFLoader(p).load()
-                docs.extend(loaded)
                 print(f"[RAG] Loaded PDF: {os.path.basename(p)} ({len(loaded)} pages)")
+                return loaded
             except Exception as e:
                 print(f"[RAG] Failed to load PDF {p}: {e}")
-        
-        # Load TXT files
-        txts = sorted(glob.glob(os.path.join(self.doc_dir, "*.txt")))
-        for t in txts:
+        else:
             try:
-                loaded = TextLoader(t, encoding='utf-8').load()
-                docs.extend(loaded)
-                print(f"[RAG] Loaded TXT: {os.path.basename(t)} ({len(loaded)} docs)")
+                loaded = TextLoader(p, encoding='utf-8').load()
+                print(f"[RAG] Loaded TXT: {os.path.basename(p)} ({len(loaded)} docs)")
+                return loaded
             except Exception as e:
-                print(f"[RAG] Failed to load TXT {t}: {e}")
+                print(f"[RAG] Failed to load TXT {p}: {e}")
+        return []
+
+    def _load_docs(self, paths: List[str]):
+        """Load the given PDF and TXT files concurrently (result keeps path order)"""
+        if len(paths) > 1:
+            with ThreadPoolExecutor(max_workers=min(8, len(paths))) as ex:
+                results = list(ex.map(self._load_one, paths))
+        else:
+            results = [self._load_one(p) for p in paths]
+        docs = [d for sub in results for d in sub]
         
         print(f"[RAG] Total documents loaded: {len(docs)}")
         return docs
 
+    def _write_manifest(self, sigs: Dict[str, str]):
+        with open(os.path.join(self.faiss_dir, CORPUS_MANIFEST), "w") as f:
+            json.dump(sigs, f, indent=1, sort_keys=True)
+
+    def _load_faiss(self):
+        """Map the saved index; the embedder is only built at first query."""
+        self.emb = _LazyEmbeddings()
+        self.vs = FAISS.load_local(self.faiss_dir, self.emb, allow_dangerous_deserialization=True)
+        self.mode = "faiss"
+        print(f"[RAG] Loaded existing FAISS index")
+
+    def _index_to_gpu(self):
+        """
+        Serve searches from a GPU copy of the index when faiss-gpu sees a
+        device. Runs after any save_local, since GPU indexes can't be written.
+        """
+        import faiss
+        if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+            return
+        try:
+            self._gpu_res = faiss.StandardGpuResources()  # must outlive the index
+            self.vs.index = faiss.index_cpu_to_gpu(self._gpu_res, 0, self.vs.index)
+            print("[RAG] FAISS index moved to GPU")
+        except Exception as e:
+            print(f"[RAG] GPU FAISS unavailable for this index, staying on CPU: {e}")
+
+    def _sync_faiss(self, paths: List[str]):
+        """
+        Bring a loaded index in line with the doc directory: chunks of removed
+        or modified files are deleted and only new/modified files are embedded.
+        IVF-PQ indexes can't drop chunks safely, so those are rebuilt instead.
+        """
+        import faiss
+        current = {os.path.basename(p): _file_sig(p) for p in paths}
+        manifest = os.path.join(self.faiss_dir, CORPUS_MANIFEST)
+        if not os.path.exists(manifest):
+            # Index predates the manifest; adopt it as built from these files
+            self._write_manifest(current)
+            return
+        with open(manifest) as f:
+            stored = json.load(f)
+        if stored == current:
+            return
+
+        stale = {name for name, sig in stored.items() if current.get(name) != sig}
+        fresh = [p for p in paths if stored.get(os.path.basename(p)) != current[os.path.basename(p)]]
+        stale_ids = [
+            doc_id for doc_id, d in self.vs.docstore._dict.items()
+            if os.path.basename((d.metadata or {}).get("source", "")) in stale
+        ]
+        if stale_ids and isinstance(self.vs.index, faiss.IndexIVF):
+            # IVF remove_ids keeps the surviving labels, but FAISS.delete
+            # renumbers its id map from 0, so the two would disagree
+            print("[RAG] IVF index has stale chunks; rebuilding")
+            self._build_faiss(paths)
+            return
+        if stale_ids:
+            self.vs.delete(stale_ids)
+        chunks = _split_docs(self._load_docs(fresh)) if fresh else []
+        if chunks:
+            self.vs.add_documents(chunks)
+            self.vs.index = _compress_index(self.vs.index)
+        self.vs.save_local(self.faiss_dir)
+        self._write_manifest(current)
+        print(f"[RAG] Updated FAISS index: -{len(stale_ids)} +{len(chunks)} chunks "
+              f"({len(stale)} files changed/removed, {len(fresh)} changed/added)")
+
+    def _build_faiss(self, paths: List[str]):
+        """Embed all chunks now (needs the model eagerly) and save the index."""
+        docs = self._load_docs(paths)
+        self.emb = _make_embeddings()
+        chunks = _split_docs(docs)
+        print(f"[RAG] Created {len(chunks)} chunks from {len(docs)} documents")
+
+        self.vs = FAISS.from_documents(chunks, self.emb)
+        self.vs.index = _compress_index(self.vs.index)
+        self.vs.save_local(self.faiss_dir)
+        self._write_manifest({os.path.basename(p): _file_sig(p) for p in paths})
+        self.mode = "faiss"
+        print(f"[RAG] Built and saved new FAISS index")
+
     def _ensure_index(self):
-        docs = self._load_docs()
-        if not docs:
+        paths = self._doc_paths()
+        if not paths:
             self.mode = "none"
             print("[RAG] No documents found in", self.doc_dir)
             return
 
         if NUMPY_AVAILABLE:
             try:
-                self.emb = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
                 if os.path.isdir(self.faiss_dir) and os.listdir(self.faiss_dir):
-                    self.vs = FAISS.load_local(self.faiss_dir, self.emb, allow_dangerous_deserialization=True)
-                    self.mode = "faiss"
-                    print(f"[RAG] Loaded existing FAISS index")
-                    return
-                
-                splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
-                chunks = splitter.split_documents(docs)
-                print(f"[RAG] Created {len(chunks)} chunks from {len(docs)} documents")
-                
-                self.vs = FAISS.from_documents(chunks, self.emb)
-                self.vs.save_local(self.faiss_dir)
-                self.mode = "faiss"
-                print(f"[RAG] Built and saved new FAISS index")
+                    self._load_faiss()
+                    self._sync_faiss(paths)
+                else:
+                    self._build_faiss(paths)
+                self._index_to_gpu()
                 return
             except Exception as e:
                 print(f"[RAG] FAISS failed → BM25 fallback: {e}")
 
+        docs = self._load_docs(paths)
+        if not docs:
+            self.mode = "none"
+            print("[RAG] No documents found in", self.doc_dir)
+            return
+
         try:
-            splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
-            chunks = splitter.split_documents(docs)
-            self.retriever = BM25Retriever.from_documents(chunks)
-            self.retriever.k = 5
+            chunks = _split_docs(docs)
+            if NUMPY_AVAILABLE:
+                self.retriever = _SparseBM25(chunks, k=5)
+            else:
+                self.retriever = BM25Retriever.from_documents(chunks)
+                self.retriever.k = 5
             self.mode = "bm25"
             print(f"[RAG] Using BM25 retriever with {len(chunks)} chunks")
         except Exception as e:
@@ -124,12 +375,83 @@ class RAGIndex:
             return hits
         return []
 
+# SOP line classifiers (compiled once). "line marker" is both a material
+# ("line") and a tool, so it gets its own group that feeds both buckets.
+# The alternation sits in a zero-width lookahead tried at every offset, so
+# matches overlap ("stoppedger" yields PPE and edger) like Hyperscan's do.
+_STEP_RE = re.compile(r"^(\d+[\).\s]|•|-)\s")
+_SOP_CAT_RE = re.compile(
+    r"(?=(?P<mat_tool>line marker)"
+    r"|(?P<mat>material|fertilizer|seed|mulch|line|marking|fuel)"
+    r"|(?P<tool>mower|edger|trimmer|blower|truck|roller|equipment)"
+    r"|(?P<safe>safety|PPE|goggles|hearing|lockout|traffic|cone))",
+    re.I,
+)
+
+# Optional Hyperscan database: the same four classifiers compiled into one
+# multi-pattern DFA, so all lines are classified in a single scan.
+if HYPERSCAN_AVAILABLE:
+    _SOP_HS_DB = hyperscan.Database()
+    _SOP_HS_DB.compile(
+        expressions=[
+            rb"^(\d+[).\t\f\x0b\r ]|\xe2\x80\xa2|-)[\t\f\x0b\r ]",  # steps; \xe2\x80\xa2 is "•" in UTF-8
+            rb"material|fertilizer|seed|mulch|line|marking|fuel",
+            rb"mower|edger|trimmer|blower|truck|line marker|roller|equipment",
+            rb"safety|PPE|goggles|hearing|lockout|traffic|cone",
+        ],
+        ids=[0, 1, 2, 3],
+        elements=4,
+        flags=[hyperscan.HS_FLAG_MULTILINE] + [hyperscan.HS_FLAG_CASELESS] * 3,
+    )
+    _SOP_HS_LOCK = threading.Lock()  # scans share the database's scratch space
+else:
+    _SOP_HS_DB = None
+
+
+def _classify_sop_lines_re(lines: List[str]):
+    """Return (steps, materials, tools, safety) line lists using `re`."""
+    steps, mats, tools, safety = [], [], [], []
+    buckets = {"mat": (mats,), "tool": (tools,), "safe": (safety,), "mat_tool": (mats, tools)}
+    for l in lines:
+        # Steps: lines with numbers or bullets
+        if _STEP_RE.match(l):
+            steps.append(l)
+        # Materials / tools / safety: one scan per line (dedup happens in caller)
+        for group in {m.lastgroup for m in _SOP_CAT_RE.finditer(l)}:
+            for bucket in buckets[group]:
+                bucket.append(l)
+    return steps, mats, tools, safety
+
+
+def _classify_sop_lines_hs(lines: List[str]):
+    """Return (steps, materials, tools, safety) line lists using one Hyperscan pass."""
+    encoded = [l.encode("utf-8") for l in lines]
+    starts, pos = [], 0
+    for b in encoded:
+        starts.append(pos)
+        pos += len(b) + 1
+
+    hits = [set() for _ in range(4)]  # line indices per pattern id
+
+    def on_match(pid, frm, to, flags, context):
+        hits[pid].add(bisect.bisect_right(starts, to - 1) - 1)
+
+    with _SOP_HS_LOCK:
+        _SOP_HS_DB.scan(b"\n".join(encoded), match_event_handler=on_match)
+    return tuple([lines[i] for i in sorted(idx)] for idx in hits)
+
+
 # Global index instance
 RAG = RAGIndex(RAG_DOC_DIR, FAISS_DIR)
 
+@functools.lru_cache(maxsize=512)
+def _cached_retrieve(query: str, k: int) -> tuple:
+    """Route plans reuse a handful of fixed queries; the index is fixed per process"""
+    return tuple(RAG.retrieve(query, k=k))
+
 def kb_retrieve(query: str, top_k: int = 3, filters: Optional[dict] = None):
     """Retrieve knowledge base document snippets"""
-    return {"hits": RAG.retrieve(query, k=top_k) if query else []}
+    return {"hits": [dict(h) for h in _cached_retrieve(query, top_k)] if query else []}
 
 def sop_extract(snippets: List[str], schema: Optional[List[str]] = None):
     """
@@ -146,26 +468,10 @@ def sop_extract(snippets: List[str], schema: Optional[List[str]] = None):
     text = "\n".join(snippets)
     lines = [l.strip() for l in text.splitlines() if l.strip()]
 
-    def pick(pred): 
-        return [l for l in lines if pred(l)]
-    
-    # Extract steps (lines with numbers or bullets)
-    steps = [l for l in lines if re.match(r"^(\d+[\).\s]|•|-)\s", l)]
-    
-    # Extract materials
-    mats = pick(lambda l: re.search(
-        r"(material|fertilizer|seed|mulch|line|marking|fuel)", l, re.I
-    ))
-    
-    # Extract tools
-    tools = pick(lambda l: re.search(
-        r"(mower|edger|trimmer|blower|truck|line marker|roller|equipment)", l, re.I
-    ))
-    
-    # Extract safety items
-    safety = pick(lambda l: re.search(
-        r"(safety|PPE|goggles|hearing|lockout|traffic|cone)", l, re.I
-    ))
+    if _SOP_HS_DB is not None:
+        steps, mats, tools, safety = _classify_sop_lines_hs(lines)
+    else:
+        steps, mats, tools, safety = _classify_sop_lines_re(lines)
     
     # Deduplicate
     dedup = lambda xs: list(dict.fromkeys(xs))
@@ -1,10 +1,23 @@
 # sql_tool.py
 from __future__ import annotations
-import os, time
-from datetime import datetime
-from typing import Any, Dict, Callable
+import os, json, time, threading, functools, atexit
+from datetime import datetime, timezone
+from typing import Any, Dict, Callable, List, Optional, Tuple
 
-import duckdb, pandas as pd
+import numpy as np, pandas as pd
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+    print("[WARN] duckdb not installed; only mowing.labor_cost_month_top1 is served (NumPy fallback)")
+
+try:
+    import python_calamine  # noqa: F401  (Rust xlsx reader; pandas engine="calamine")
+    CALAMINE_AVAILABLE = True
+except ImportError:
+    CALAMINE_AVAILABLE = False
 
 # -----------------------------
 # Config (adjust paths as needed)
@@ -13,42 +26,244 @@ DATA_DIR = os.path.abspath("data")
 DUCK_FILE = os.path.join(DATA_DIR, "mowing.duckdb")
 LABOR_XLSX = os.path.join(DATA_DIR, "6 Mowing Reports to Jun 20 2025.xlsx")
 LABOR_SHEET = 0  # or sheet name string
+LABOR_PARQUET = os.path.join(DATA_DIR, "labor.parquet")  # columnar cache of LABOR_XLSX
+LABOR_PARQUET_SRC = LABOR_PARQUET + ".src"  # JSON {mtime, size} of the XLSX it came from
+# Only these sheet columns feed labor_monthly; the rest are never ingested
+LABOR_COLUMNS = ("Posting Date", "CO Object Name", "ParActivity", "Val.in rep.cur.", "Total quantity")
 
 # -----------------------------
 # DuckDB bootstrap
 # -----------------------------
-def _ensure_duck() -> duckdb.DuckDBPyConnection:
-    """Create a DuckDB connection and load the latest Excel into a table."""
-    con = duckdb.connect(DUCK_FILE)
+# One process-wide connection; labor_data is only re-ingested when the Excel
+# file's mtime or size changes. Requests get their own cursor (see run_sql_template).
+_CON: Optional[duckdb.DuckDBPyConnection] = None
+_XLSX_SIG: Optional[Tuple[float, int]] = None
+_CON_LOCK = threading.Lock()
 
-    # Read Excel fresh (simple & explicit for MVP)
-    df = pd.read_excel(LABOR_XLSX, sheet_name=LABOR_SHEET)
-    # Normalize column names
-    df.columns = [str(c).strip() for c in df.columns]
 
-    # Parse dates robustly (avoid out-of-bounds errors)
-    if "Posting Date" in df.columns:
-        # try a fast path, then a tolerant path
-        try:
-            df["Posting Date"] = pd.to_datetime(df["Posting Date"], format="%m/%d/%y", errors="coerce")
-        except Exception:
-            pass
-        df["Posting Date"] = pd.to_datetime(df["Posting Date"], errors="coerce")
-        df = df.dropna(subset=["Posting Date"])
+def _q(ident: str) -> str:
+    """Quote a SQL identifier."""
+    return '"' + str(ident).replace('"', '""') + '"'
+
+
+def _lit(value: str) -> str:
+    """Quote a SQL string literal (for statements that cannot take parameters)."""
+    return "'" + str(value).replace("'", "''") + "'"
+
 
-    # Ensure numeric cost
-    if "Val.in rep.cur." in df.columns:
-        df["Val.in rep.cur."] = pd.to_numeric(df["Val.in rep.cur."], errors="coerce").fillna(0.0)
+def _create_typed_labor_table(con: duckdb.DuckDBPyConnection, table: str, src: str, args: List[Any]) -> None:
+    """
+    Create temp table `table` from the LABOR_COLUMNS of relation `src`,
+    stripping column names and coercing "Posting Date" / "Val.in rep.cur." in SQL. Rows without a usable
+    posting date are dropped.
+    """
+    cols = con.execute(f"DESCRIBE SELECT * FROM {src}", args).fetchall()
+
+    select = []
+    for name, col_type, *_ in cols:
+        clean = str(name).strip()  # normalize column names
+        if clean not in LABOR_COLUMNS:
+            continue
+        if clean == "Posting Date":
+            if col_type == "VARCHAR":
+                expr = f"COALESCE(TRY_STRPTIME({_q(name)}, '%m/%d/%y'), TRY_CAST({_q(name)} AS TIMESTAMP))"
+            else:
+                expr = f"TRY_CAST({_q(name)} AS TIMESTAMP)"
+        elif clean == "Val.in rep.cur.":
+            expr = f"COALESCE(TRY_CAST({_q(name)} AS DOUBLE), 0.0)"
+        else:
+            expr = _q(name)
+        select.append(f"{expr} AS {_q(clean)}")
+
+    where = ' WHERE "Posting Date" IS NOT NULL' if "Posting Date" in (str(c[0]).strip() for c in cols) else ""
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {table} AS "
+        f"SELECT * FROM (SELECT {', '.join(select)} FROM {src}){where}",
+        args,
+    )
 
-    # Re-create table
-    con.execute("DROP TABLE IF EXISTS labor_data")
+
+def _load_labor_data_native(con: duckdb.DuckDBPyConnection, table: str) -> bool:
+    """
+    Create temp table `table` straight from the XLSX with DuckDB's excel extension.
+    Returns False when the extension is unavailable or the sheet cannot be
+    read with typed columns (e.g. mixed text/date cells), so the caller can
+    fall back to pandas.
+    """
+    if isinstance(LABOR_SHEET, int) and LABOR_SHEET != 0:
+        return False  # read_xlsx selects sheets by name only
+    src = "read_xlsx(?, sheet = ?)" if isinstance(LABOR_SHEET, str) else "read_xlsx(?)"
+    args = [LABOR_XLSX, LABOR_SHEET] if isinstance(LABOR_SHEET, str) else [LABOR_XLSX]
+
+    try:
+        con.execute("INSTALL excel; LOAD excel;")
+        _create_typed_labor_table(con, table, src, args)
+        return True
+    except duckdb.Error as e:
+        print(f"[SQL] DuckDB excel reader unavailable, falling back to pandas: {e}")
+        return False
+
+
+def _load_labor_data_pandas(con: duckdb.DuckDBPyConnection, table: str) -> None:
+    """
+    Read the Excel file with pandas into temp table `table`. pandas only
+    parses the workbook; mixed-type columns arrive in DuckDB as VARCHAR and
+    get the same SQL coercion as the native path.
+    """
+    df = pd.read_excel(
+        LABOR_XLSX,
+        sheet_name=LABOR_SHEET,
+        usecols=lambda c: str(c).strip() in LABOR_COLUMNS,
+        engine="calamine" if CALAMINE_AVAILABLE else None,
+    )
     con.register("labor_df", df)
-    con.execute("CREATE TABLE labor_data AS SELECT * FROM labor_df")
-    return con
+    try:
+        _create_typed_labor_table(con, table, "labor_df", [])
+    finally:
+        con.unregister("labor_df")
+
+
+# Every template aggregates by (year, month, park[, activity]); they all read
+# this small rollup instead of rescanning labor_data.
+_LABOR_MONTHLY_SQL = """
+CREATE OR REPLACE TABLE labor_monthly AS
+SELECT
+    year("Posting Date") AS y,
+    month("Posting Date") AS m,
+    "CO Object Name" AS park,
+    "ParActivity" AS activity,
+    lower("CO Object Name") AS park_lc,  -- folded once here for park filters
+    SUM("Val.in rep.cur.") AS total_cost,  -- already DOUBLE from ingest
+    COUNT(*) AS sessions,
+    CAST(SUM("Total quantity") AS DOUBLE) AS total_quantity,
+    MAX("Posting Date") AS last_date
+FROM labor_data
+GROUP BY 1, 2, 3, 4, 5
+ORDER BY 1, 2  -- (y, m) clustered, so row-group zonemaps prune month filters
+"""
+
+
+def _xlsx_sig() -> Tuple[float, int]:
+    """(mtime, size) of LABOR_XLSX; any difference means a different workbook."""
+    st = os.stat(LABOR_XLSX)
+    return (st.st_mtime, st.st_size)
+
+
+def _parquet_is_fresh(sig: Tuple[float, int]) -> bool:
+    """
+    True when LABOR_PARQUET was converted from exactly this XLSX signature.
+    Compared for equality, not "newer than": a workbook copied in with an
+    older mtime (cp -p, rsync, restore) must still be re-ingested.
+    """
+    try:
+        with open(LABOR_PARQUET_SRC) as f:
+            src = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return os.path.exists(LABOR_PARQUET) and (src.get("mtime"), src.get("size")) == sig
+
+
+def _labor_tables_current(con: duckdb.DuckDBPyConnection, sig: Tuple[float, int]) -> bool:
+    """
+    True when DUCK_FILE already holds the labor_data view and labor_monthly
+    rollup built from this version of the XLSX (recorded in labor_meta).
+    """
+    try:
+        row = con.execute("SELECT source_mtime, source_size, parquet FROM labor_meta").fetchone()
+    except (duckdb.CatalogException, duckdb.BinderException):
+        return False  # no labor_meta yet, or one from an older layout
+    return row == (*sig, LABOR_PARQUET) and _parquet_is_fresh(sig)
+
+
+def _load_labor_data(con: duckdb.DuckDBPyConnection, sig: Tuple[float, int]) -> None:
+    """
+    Point labor_data at a zstd Parquet cache of the Excel file. The Excel is
+    only parsed (natively in DuckDB when possible) when the cache was not
+    built from this exact XLSX (mtime + size); otherwise startup just maps
+    the Parquet file. Both objects persist in DUCK_FILE, so a restart against
+    an unchanged XLSX skips all of this.
+    """
+    if _labor_tables_current(con, sig):
+        return
+    if not _parquet_is_fresh(sig):
+        if not _load_labor_data_native(con, "labor_stage"):
+            _load_labor_data_pandas(con, "labor_stage")
+        tmp = LABOR_PARQUET + ".tmp"
+        # Sorted by date so Parquet row-group min/max stats prune date-range scans
+        con.execute(
+            f'COPY (SELECT * FROM labor_stage ORDER BY "Posting Date") '
+            f"TO {_lit(tmp)} (FORMAT PARQUET, COMPRESSION ZSTD)"
+        )
+        con.execute("DROP TABLE labor_stage")
+        if os.path.exists(LABOR_PARQUET_SRC):
+            os.remove(LABOR_PARQUET_SRC)  # a crash below leaves the cache unclaimed
+        os.replace(tmp, LABOR_PARQUET)  # readers never see a half-written file
+        with open(LABOR_PARQUET_SRC, "w") as f:
+            json.dump({"mtime": sig[0], "size": sig[1]}, f)
+
+    # Older databases hold labor_data as a table; it is a view from now on
+    if con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'labor_data' AND NOT temporary"
+    ).fetchone()[0]:
+        con.execute("DROP TABLE labor_data")
+    con.execute(f"CREATE OR REPLACE VIEW labor_data AS SELECT * FROM read_parquet({_lit(LABOR_PARQUET)})")
+    con.execute(_LABOR_MONTHLY_SQL)
+    con.execute("CREATE OR REPLACE TABLE labor_meta (source_mtime DOUBLE, source_size BIGINT, parquet VARCHAR)")
+    con.execute("INSERT INTO labor_meta VALUES (?, ?, ?)", [*sig, LABOR_PARQUET])
+
+
+def _ensure_duck() -> duckdb.DuckDBPyConnection:
+    """Return the shared DuckDB connection, loading the Excel only when it changed."""
+    global _CON, _XLSX_SIG
+    sig = _xlsx_sig()
+    with _CON_LOCK:
+        if _CON is not None and sig == _XLSX_SIG:
+            return _CON
+        if _CON is None:
+            _CON = duckdb.connect(DUCK_FILE)
+            # Ingest is bulk CTAS/COPY; every statement whose output order
+            # matters (rollup, Parquet cache, templates) has an explicit ORDER BY
+            _CON.execute("SET preserve_insertion_order = false")
+        _load_labor_data(_CON, sig)
+        _XLSX_SIG = sig
+        return _CON
+
+
+@atexit.register
+def _close_duck() -> None:
+    """Close the shared connection at interpreter exit (checkpoints the WAL)."""
+    global _CON
+    with _CON_LOCK:
+        if _CON is not None:
+            try:
+                _CON.close()
+            except Exception:
+                pass
+            _CON = None
 
 # -----------------------------
 # Template implementations
 # -----------------------------
+def _fetch_records(con: duckdb.DuckDBPyConnection, sql: str, args: List[Any]) -> List[Dict[str, Any]]:
+    """Run a statement and return its rows as dicts, without building a DataFrame."""
+    res = con.execute(sql, args)
+    cols = [d[0] for d in res.description]
+    return [dict(zip(cols, r)) for r in res.fetchall()]
+
+
+# SQL text is constant per template (user values are bound as parameters), so
+# statements are never rebuilt from request data and cannot be injected into.
+_SQL_LABOR_COST_MONTH_TOP1 = """
+    SELECT park, SUM(total_cost) AS total_cost
+    FROM labor_monthly
+    WHERE y = ?
+      AND m = ?
+    GROUP BY park
+    ORDER BY total_cost DESC, park
+    LIMIT 1;
+"""
+
+
 def _tpl_mowing_labor_cost_month_top1(con: duckdb.DuckDBPyConnection, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns the park with the highest total mowing labor cost in the given month/year.
@@ -59,32 +274,41 @@ def _tpl_mowing_labor_cost_month_top1(con: duckdb.DuckDBPyConnection, params: Di
 
     # Validate defaults if missing
     if not isinstance(month, int) or month < 1 or month > 12:
-        month = datetime.utcnow().month
+        month = datetime.now(timezone.utc).month
     if not isinstance(year, int) or year < 2000 or year > 2100:
-        year = datetime.utcnow().year
-
-    sql = f"""
-    WITH month_data AS (
-      SELECT
-        "CO Object Name" AS park,
-        CAST("Val.in rep.cur." AS DOUBLE) AS cost,
-        "Posting Date"::TIMESTAMP AS posting_dt
-      FROM labor_data
-    )
-    SELECT park, SUM(cost) AS total_cost
-    FROM month_data
-    WHERE year(posting_dt) = {year}
-      AND month(posting_dt) = {month}
-    GROUP BY park
-    ORDER BY total_cost DESC
-    LIMIT 1;
-    """
+        year = datetime.now(timezone.utc).year
+
     t0 = time.time()
-    rows = con.execute(sql).fetchdf().to_dict(orient="records")
+    rows = _fetch_records(con, _SQL_LABOR_COST_MONTH_TOP1, [year, month])
     elapsed = int((time.time() - t0) * 1000)
     return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed}
 
 
+_SQL_LAST_DATE_ONE_PARK = """
+    SELECT 
+        park,
+        MAX(last_date) AS last_mowing_date,
+        CAST(SUM(sessions) AS BIGINT) AS total_mowing_sessions,
+        SUM(total_cost) AS total_cost
+    FROM labor_monthly
+    WHERE contains(park_lc, ?)
+    GROUP BY park
+    ORDER BY last_mowing_date DESC, park
+    LIMIT 1;
+"""
+
+_SQL_LAST_DATE_ALL_PARKS = """
+    SELECT 
+        park,
+        MAX(last_date) AS last_mowing_date,
+        CAST(SUM(sessions) AS BIGINT) AS total_sessions,
+        SUM(total_cost) AS total_cost
+    FROM labor_monthly
+    GROUP BY park
+    ORDER BY last_mowing_date DESC, park;
+"""
+
+
 def _tpl_mowing_last_date_by_park(con: duckdb.DuckDBPyConnection, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns the most recent mowing date for a specific park or all parks.
@@ -98,37 +322,35 @@ def _tpl_mowing_last_date_by_park(con: duckdb.DuckDBPyConnection, params: Dict[s
     
     if park_name:
         # Specific park query
-        sql = f"""
-        SELECT 
-            "CO Object Name" AS park,
-            MAX("Posting Date") AS last_mowing_date,
-            COUNT(*) AS total_mowing_sessions,
-            SUM(CAST("Val.in rep.cur." AS DOUBLE)) AS total_cost
-        FROM labor_data
-        WHERE LOWER("CO Object Name") LIKE LOWER('%{park_name}%')
-        GROUP BY "CO Object Name"
-        ORDER BY last_mowing_date DESC
-        LIMIT 1;
-        """
+        sql, args = _SQL_LAST_DATE_ONE_PARK, [park_name.lower()]
     else:
         # All parks query
-        sql = """
-        SELECT 
-            "CO Object Name" AS park,
-            MAX("Posting Date") AS last_mowing_date,
-            COUNT(*) AS total_sessions,
-            SUM(CAST("Val.in rep.cur." AS DOUBLE)) AS total_cost
-        FROM labor_data
-        GROUP BY "CO Object Name"
-        ORDER BY last_mowing_date DESC;
-        """
+        sql, args = _SQL_LAST_DATE_ALL_PARKS, []
     
     t0 = time.time()
-    rows = con.execute(sql).fetchdf().to_dict(orient="records")
+    rows = _fetch_records(con, sql, args)
     elapsed = int((time.time() - t0) * 1000)
     return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed}
 
 
+_SQL_COST_TREND = """
+    SELECT 
+        y AS year,
+        m AS month,
+        park,
+        SUM(total_cost) AS monthly_cost,
+        CAST(SUM(sessions) AS BIGINT) AS session_count
+    FROM labor_monthly
+    WHERE y = ?
+      AND m BETWEEN ? AND ?
+      {park_filter}
+    GROUP BY y, m, park
+    ORDER BY year, month, park;
+"""
+_SQL_COST_TREND_ALL_PARKS = _SQL_COST_TREND.format(park_filter="")
+_SQL_COST_TREND_ONE_PARK = _SQL_COST_TREND.format(park_filter="AND contains(park_lc, ?)")
+
+
 def _tpl_mowing_cost_trend(con: duckdb.DuckDBPyConnection, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns monthly mowing cost trend for a date range.
@@ -150,47 +372,39 @@ def _tpl_mowing_cost_trend(con: duckdb.DuckDBPyConnection, params: Dict[str, Any
     
     # Defaults
     if not isinstance(year, int) or year < 2000:
-        year = datetime.utcnow().year
+        year = datetime.now(timezone.utc).year
     if not isinstance(start_month, int) or start_month < 1 or start_month > 12:
         start_month = 1
     if not isinstance(end_month, int) or end_month < 1 or end_month > 12:
         end_month = 12
     
-    # Build WHERE clause for park filter
-    park_filter = ""
+    # Optional park filter
     if park_name:
-        park_filter = f"AND LOWER(\"CO Object Name\") LIKE LOWER('%{park_name}%')"
-    
-    sql = f"""
-    WITH monthly_costs AS (
-        SELECT 
-            year("Posting Date") AS year,
-            month("Posting Date") AS month,
-            "CO Object Name" AS park,
-            SUM(CAST("Val.in rep.cur." AS DOUBLE)) AS monthly_cost,
-            COUNT(*) AS session_count
-        FROM labor_data
-        WHERE year("Posting Date") = {year}
-          AND month("Posting Date") BETWEEN {start_month} AND {end_month}
-          {park_filter}
-        GROUP BY year("Posting Date"), month("Posting Date"), "CO Object Name"
-    )
-    SELECT 
-        year,
-        month,
-        park,
-        monthly_cost,
-        session_count
-    FROM monthly_costs
-    ORDER BY year, month, park;
-    """
+        sql, args = _SQL_COST_TREND_ONE_PARK, [year, start_month, end_month, park_name.lower()]
+    else:
+        sql, args = _SQL_COST_TREND_ALL_PARKS, [year, start_month, end_month]
     
     t0 = time.time()
-    rows = con.execute(sql).fetchdf().to_dict(orient="records")
+    rows = _fetch_records(con, sql, args)
     elapsed = int((time.time() - t0) * 1000)
     return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed, "chart_type": "line"}
 
 
+_SQL_COST_BY_PARK_MONTH = """
+    SELECT 
+        park,
+        SUM(total_cost) AS total_cost,
+        CAST(SUM(sessions) AS BIGINT) AS mowing_sessions,
+        SUM(total_cost) / SUM(sessions) AS avg_cost_per_session,
+        SUM(total_quantity) AS total_quantity
+    FROM labor_monthly
+    WHERE y = ?
+      AND m = ?
+    GROUP BY park
+    ORDER BY total_cost DESC, park;
+"""
+
+
 def _tpl_mowing_cost_by_park_month(con: duckdb.DuckDBPyConnection, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns cost comparison across all parks for a specific month.
@@ -205,30 +419,40 @@ def _tpl_mowing_cost_by_park_month(con: duckdb.DuckDBPyConnection, params: Dict[
     
     # Defaults
     if not isinstance(month, int) or month < 1 or month > 12:
-        month = datetime.utcnow().month
+        month = datetime.now(timezone.utc).month
     if not isinstance(year, int) or year < 2000 or year > 2100:
-        year = datetime.utcnow().year
-    
-    sql = f"""
-    SELECT 
-        "CO Object Name" AS park,
-        SUM(CAST("Val.in rep.cur." AS DOUBLE)) AS total_cost,
-        COUNT(*) AS mowing_sessions,
-        AVG(CAST("Val.in rep.cur." AS DOUBLE)) AS avg_cost_per_session,
-        SUM("Total quantity") AS total_quantity
-    FROM labor_data
-    WHERE year("Posting Date") = {year}
-      AND month("Posting Date") = {month}
-    GROUP BY "CO Object Name"
-    ORDER BY total_cost DESC;
-    """
+        year = datetime.now(timezone.utc).year
     
     t0 = time.time()
-    rows = con.execute(sql).fetchdf().to_dict(orient="records")
+    rows = _fetch_records(con, _SQL_COST_BY_PARK_MONTH, [year, month])
     elapsed = int((time.time() - t0) * 1000)
     return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed, "chart_type": "bar"}
 
 
+_SQL_COST_BREAKDOWN = """
+    SELECT 
+        park,
+        m AS month,
+        activity AS activity_type,
+        SUM(total_cost) AS cost,
+        CAST(SUM(sessions) AS BIGINT) AS sessions,
+        SUM(total_quantity) AS total_quantity
+    FROM labor_monthly
+    WHERE y = ?{park_filter}{month_filter}
+    GROUP BY park, m, activity
+    ORDER BY park, month, cost DESC, activity_type;
+"""
+# Keyed by (has_park_filter, has_month_filter)
+_SQL_COST_BREAKDOWN_VARIANTS = {
+    (has_park, has_month): _SQL_COST_BREAKDOWN.format(
+        park_filter=" AND contains(park_lc, ?)" if has_park else "",
+        month_filter=" AND m = ?" if has_month else "",
+    )
+    for has_park in (False, True)
+    for has_month in (False, True)
+}
+
+
 def _tpl_mowing_cost_breakdown_by_park(con: duckdb.DuckDBPyConnection, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Returns detailed monthly cost breakdown for a specific park or all parks.
@@ -248,35 +472,19 @@ def _tpl_mowing_cost_breakdown_by_park(con: duckdb.DuckDBPyConnection, params: D
     
     # Defaults
     if not isinstance(year, int) or year < 2000 or year > 2100:
-        year = datetime.utcnow().year
-    
-    # Build WHERE clause
-    where_parts = [f"year(\"Posting Date\") = {year}"]
+        year = datetime.now(timezone.utc).year
     
+    # Pick the statement variant and bind its parameters in order
+    has_month = isinstance(month, int) and 1 <= month <= 12
+    args = [year]
     if park_name:
-        where_parts.append(f"LOWER(\"CO Object Name\") LIKE LOWER('%{park_name}%')")
-    
-    if isinstance(month, int) and 1 <= month <= 12:
-        where_parts.append(f"month(\"Posting Date\") = {month}")
-    
-    where_clause = " AND ".join(where_parts)
-    
-    sql = f"""
-    SELECT 
-        "CO Object Name" AS park,
-        month("Posting Date") AS month,
-        "ParActivity" AS activity_type,
-        SUM(CAST("Val.in rep.cur." AS DOUBLE)) AS cost,
-        COUNT(*) AS sessions,
-        SUM("Total quantity") AS total_quantity
-    FROM labor_data
-    WHERE {where_clause}
-    GROUP BY "CO Object Name", month("Posting Date"), "ParActivity"
-    ORDER BY park, month, cost DESC;
-    """
+        args.append(park_name.lower())
+    if has_month:
+        args.append(month)
+    sql = _SQL_COST_BREAKDOWN_VARIANTS[(bool(park_name), has_month)]
     
     t0 = time.time()
-    rows = con.execute(sql).fetchdf().to_dict(orient="records")
+    rows = _fetch_records(con, sql, args)
     elapsed = int((time.time() - t0) * 1000)
     return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed}
 
@@ -301,9 +509,100 @@ TEMPLATE_REGISTRY: Dict[str, Callable[[duckdb.DuckDBPyConnection, Dict[str, Any]
     "mowing.cost_breakdown": _tpl_mowing_cost_breakdown_by_park,
 }
 
+# -----------------------------
+# NumPy fallback (no DuckDB)
+# -----------------------------
+@functools.lru_cache(maxsize=1)
+def _labor_arrays(xlsx_sig: Tuple[float, int]) -> Dict[str, Any]:
+    """
+    Column arrays for the month top-1 query when DuckDB is not installed:
+    posting year/month, factorized park codes and cost. Keyed by the XLSX
+    (mtime, size), so a changed workbook is re-read on the next call.
+    """
+    df = pd.read_excel(
+        LABOR_XLSX,
+        sheet_name=LABOR_SHEET,
+        usecols=lambda c: str(c).strip() in LABOR_COLUMNS,
+        engine="calamine" if CALAMINE_AVAILABLE else None,
+    )
+    df.columns = [str(c).strip() for c in df.columns]
+
+    # Same rules as the SQL ingest: m/d/y text first, then ISO 8601 (what
+    # TRY_CAST(... AS TIMESTAMP) accepts); anything else is dropped there too
+    raw = df["Posting Date"]
+    dates = pd.to_datetime(raw, format="%m/%d/%y", errors="coerce")
+    dates = dates.fillna(pd.to_datetime(raw.where(dates.isna()), format="ISO8601", errors="coerce"))
+    keep = dates.notna().to_numpy()
+    dates = dates[keep]
+
+    codes, parks = pd.factorize(df["CO Object Name"][keep], use_na_sentinel=False)
+    cost = pd.to_numeric(df["Val.in rep.cur."][keep], errors="coerce").fillna(0.0)
+    return {
+        "year": dates.dt.year.to_numpy(np.int16),
+        "month": dates.dt.month.to_numpy(np.int8),
+        "park_codes": codes,
+        "parks": [None if pd.isna(p) else p for p in parks],
+        "cost": cost.to_numpy(np.float64),
+    }
+
+
+def _np_mowing_labor_cost_month_top1(arrs: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    """NumPy version of _tpl_mowing_labor_cost_month_top1 (masked bincount by park)."""
+    month = params.get("month")
+    year = params.get("year")
+
+    # Validate defaults if missing
+    if not isinstance(month, int) or month < 1 or month > 12:
+        month = datetime.now(timezone.utc).month
+    if not isinstance(year, int) or year < 2000 or year > 2100:
+        year = datetime.now(timezone.utc).year
+
+    t0 = time.time()
+    rows = []
+    mask = (arrs["year"] == year) & (arrs["month"] == month)
+    if mask.any():
+        n = len(arrs["parks"])
+        codes = arrs["park_codes"][mask]
+        totals = np.bincount(codes, weights=arrs["cost"][mask], minlength=n)
+        totals[np.bincount(codes, minlength=n) == 0] = -np.inf  # parks absent this month
+        # ORDER BY total_cost DESC, park
+        best = min(np.flatnonzero(totals == totals.max()), key=lambda i: str(arrs["parks"][i]))
+        rows = [{"park": arrs["parks"][best], "total_cost": float(totals[best])}]
+    elapsed = int((time.time() - t0) * 1000)
+    return {"rows": rows, "rowcount": len(rows), "elapsed_ms": elapsed}
+
+
+NUMPY_TEMPLATE_REGISTRY: Dict[str, Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = {
+    "mowing.labor_cost_month_top1": _np_mowing_labor_cost_month_top1,
+}
+
 # -----------------------------
 # Public entry point
 # -----------------------------
+@functools.lru_cache(maxsize=256)
+def _run_template_cached(
+    template: str, params_key: tuple, data_version: Tuple[float, int], default_ym: Tuple[int, int]
+) -> Dict[str, Any]:
+    """
+    Memoized template run. data_version is the XLSX (mtime, size) the connection was
+    loaded from, so a reload naturally misses every older entry. default_ym is
+    the current UTC (year, month) that templates fall back to for a missing
+    month/year; it is only part of the key, so such results expire on rollover.
+    """
+    if not DUCKDB_AVAILABLE:
+        return NUMPY_TEMPLATE_REGISTRY[template](_labor_arrays(data_version), dict(params_key))
+
+    # DuckDB connections are not safe to share across threads; cursors are
+    con = _ensure_duck().cursor()
+    try:
+        return TEMPLATE_REGISTRY[template](con, dict(params_key))
+    finally:
+        try:
+            con.close()
+        except Exception:
+            pass
+
+
 def run_sql_template(template: str, params: Dict[str, Any]) -> Dict[str, Any]:
     """
     Unified SQL template executor.
@@ -317,16 +616,31 @@ def run_sql_template(template: str, params: Dict[str, Any]) -> Dict[str, Any]:
             "elapsed_ms": 0,
         }
 
-    con = _ensure_duck()
+    if not DUCKDB_AVAILABLE and template not in NUMPY_TEMPLATE_REGISTRY:
+        return {
+            "rows": [{"error": f"SQL template {template} requires duckdb"}],
+            "rowcount": 1,
+            "elapsed_ms": 0,
+        }
+
+    t0 = time.time()
+    if DUCKDB_AVAILABLE:
+        _ensure_duck()  # reloads (and bumps _XLSX_SIG) if the workbook changed
+        version = _XLSX_SIG
+    else:
+        version = _xlsx_sig()
+    now = datetime.now(timezone.utc)
+    default_ym = (now.year, now.month)
+    params_key = tuple(sorted((params or {}).items()))
     try:
-        func = TEMPLATE_REGISTRY[template]
-        out = func(con, params or {})
-        return out
-    finally:
-        try:
-            con.close()
-        except Exception:
-            pass
+        hash(params_key)
+    except TypeError:  # unhashable param values: run uncached
+        return _run_template_cached.__wrapped__(template, params_key, version, default_ym)
+
+    out = _run_template_cached(template, params_key, version, default_ym)
+    # Callers may mutate the result (e.g. add "support"), so hand out copies;
+    # elapsed_ms is this call's time, which is ~0 on a cache hit
+    return {**out, "rows": [dict(r) for r in out["rows"]], "elapsed_ms": int((time.time() - t0) * 1000)}
 
 # -----------------------------
 # RAG-compatible wrapper (for executor.py)